@@ -2,11 +2,17 @@
 # -*- coding: utf-8 -*-
 import time
 import json
-import telnetlib
+import socket
+import select
 import requests
+from requests.adapters import HTTPAdapter
 import re
 import logging
-from datetime import datetime, timedelta
+from functools import lru_cache
+from collections import OrderedDict
+from queue import Queue, Full
+from threading import Thread
+from typing import List, NamedTuple, Optional, Tuple
 
 CONFIG_FILE = "config.json"
 
@@ -18,8 +24,61 @@ logging.basicConfig(
     datefmt="%Y-%m-%d %H:%M:%S"
 )
 
-# dedup in memory
-last_spots = {}
+# Telegram HTTP session (keep-alive)
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
+# outgoing Telegram messages, drained by a worker thread
+_TG_Q: Queue = Queue(maxsize=256)
+
+# dedup in memory, oldest first
+last_spots: "OrderedDict[str, float]" = OrderedDict()
+
+_CALL_RE = re.compile(r'[^A-Z0-9/]')
+_MODE_RE = re.compile(r'\b(CW|FT8|RTTY|SSB|USB|LSB)\b', re.IGNORECASE)
+
+# band edges in kHz (inclusive)
+_BANDS = (
+    (1800, 2000, "160m"),
+    (3500, 3800, "80m"),
+    (5300, 5400, "60m"),
+    (7000, 7200, "40m"),
+    (10100, 10150, "30m"),
+    (14000, 14350, "20m"),
+    (18068, 18168, "17m"),
+    (21000, 21450, "15m"),
+    (24890, 24990, "12m"),
+    (28000, 29700, "10m"),
+    (50000, 54000, "6m"),
+)
+
+# band name per integer kHz, None outside the bands
+_lut: List[Optional[str]] = [None] * (_BANDS[-1][1] + 1)
+for _low, _high, _band in _BANDS:
+    for _k in range(_low, _high + 1):
+        _lut[_k] = _band
+_BAND_LUT = tuple(_lut)
+
+# Telegram alert text, filled from a parsed spot
+_MSG_TEMPLATE = (
+    "🛰️ <b>Spot DXCluster</b>\n"
+    "Station: <b>{s.call}</b>\n"
+    "Freq: {s.freq} kHz ({s.band})\n"
+    "Mode: {s.mode}\n"
+    "Date/Time: {s.datetime}\n"
+    "Comment: {s.info}\n"
+    "Spotter: {s.spotter}"
+)
+
+class Spot(NamedTuple):
+    """A parsed VE7CC spot"""
+    freq: str
+    call: str
+    datetime: str
+    info: str
+    spotter: str
+    band: str
+    mode: str
 
 # --- Utility ---
 def load_config():
@@ -27,11 +86,26 @@ def load_config():
         return json.load(f)
 
 def send_telegram(token, chat_ids, text):
+    """Queues a message so the listener never blocks on HTTPS"""
+    try:
+        _TG_Q.put_nowait((token, chat_ids, text))
+    except Full:
+        logging.error("Telegram queue full, dropping message")
+
+def _telegram_worker():
+    while True:
+        token, chat_ids, text = _TG_Q.get()
+        _do_send(token, chat_ids, text)
+
+def start_telegram_worker():
+    Thread(target=_telegram_worker, daemon=True).start()
+
+def _do_send(token, chat_ids, text):
     if not isinstance(chat_ids, list):
         chat_ids = [chat_ids]
     for chat_id in chat_ids:
         try:
-            requests.post(
+            _SESSION.post(
                 f"https://api.telegram.org/bot{token}/sendMessage",
                 json={"chat_id": chat_id, "text": text, "parse_mode": "HTML"},
                 timeout=10
@@ -39,81 +113,90 @@ def send_telegram(token, chat_ids, text):
         except Exception as e:
             logging.error(f"Telegram Error chat_id {chat_id}: {e}")
 
-def normalize_call(c):
-    return re.sub(r'[^A-Z0-9/]', '', c.upper())
+@lru_cache(maxsize=4096)
+def normalize_call(c: str) -> str:
+    return _CALL_RE.sub('', c.upper())
+
+def _field(raw: bytes, default: str) -> str:
+    return raw.decode("utf-8", errors="replace") if raw else default
 
-def parse_ve7cc_line(line):
-    parts = line.split("^")
+def spot_call(line: bytes) -> str:
+    """Extracts the callsign field of a raw VE7CC line without a full parse"""
+    start = line.find(b"^")
+    if start != -1:
+        start = line.find(b"^", start + 1)
+    if start == -1:
+        return ""
+    end = line.find(b"^", start + 1)
+    return _field(line[start + 1:end] if end != -1 else line[start + 1:], "")
+
+def parse_ve7cc_line(line: bytes, drop_unknown: bool = False) -> Optional[Spot]:
+    """Parses a raw VE7CC (CC11) spot line, decoding only the fields used.
+    With drop_unknown, spots with neither a known band nor mode return None."""
+    parts = line.split(b"^")
     if len(parts) < 7:
         return None
-    freq = parts[1] or "?"
-    call = parts[2] or "?"
-    date = parts[3] or ""
-    time_utc = parts[4] or ""
-    info = parts[5] or ""
-    spotter = parts[6] or "?"
-    return {
-        "freq": freq,
-        "call": call,
-        "datetime": f"{date} {time_utc}",
-        "info": info,
-        "spotter": spotter,
-        "band": freq_to_band(freq),
-        "mode": extract_mode(info),
-    }
-
-def freq_to_band(freq_str):
+    freq = _field(parts[1], "?")
+    call = _field(parts[2], "?")
+    date = _field(parts[3], "")
+    time_utc = _field(parts[4], "")
+    info = _field(parts[5], "")
+    spotter = _field(parts[6], "?")
+    band = freq_to_band(freq)
+    mode = extract_mode(info)
+    if drop_unknown and band == "?" and mode == "?":
+        return None
+    return Spot(freq, call, f"{date} {time_utc}", info, spotter, band, mode)
+
+def freq_to_band(freq_str: str, _table: Tuple[Optional[str], ...] = _BAND_LUT) -> str:
+    # _table is bound as a default so the lookup is a local, not a global
     try:
-        freq = float(freq_str)
-    except ValueError:
+        khz = int(float(freq_str))
+    except (ValueError, OverflowError):
         return "?"
-    bands = [
-        (1800, 2000, "160m"),
-        (3500, 3800, "80m"),
-        (5300, 5400, "60m"),
-        (7000, 7200, "40m"),
-        (10100, 10150, "30m"),
-        (14000, 14350, "20m"),
-        (18068, 18168, "17m"),
-        (21000, 21450, "15m"),
-        (24890, 24990, "12m"),
-        (28000, 29700, "10m"),
-        (50000, 54000, "6m")
-    ]
-    for low, high, band in bands:
-        if low <= freq <= high:
-            return band
+    if 0 <= khz < len(_table):
+        return _table[khz] or "?"
     return "?"
 
-def extract_mode(info_str):
-    info = info_str.upper()
-    for m in ["CW", "FT8", "RTTY"]:
-        if m in info:
-            return m
-    if any(s in info for s in ["SSB", "USB", "LSB"]):
-        return "SSB"
-    return "?"
+def extract_mode(info_str: str) -> str:
+    m = _MODE_RE.search(info_str)
+    if not m:
+        return "?"
+    mode = m.group(1).upper()
+    return "SSB" if mode in ("USB", "LSB") else mode
 
-def matches_target(parsed, target):
-    call_n = normalize_call(parsed["call"])
-    t_call = normalize_call(target.get("call", ""))
-    if call_n != t_call:
+def prepare_targets(targets):
+    """Normalizes target call, bands and modes once at config load"""
+    for target in targets:
+        target["_call"] = normalize_call(target.get("call", ""))
+        target["_bands"] = frozenset(b.upper() for b in target.get("bands", []))
+        target["_modes"] = frozenset(m.upper() for m in target.get("modes", []))
+    return targets
+
+def matches_target(parsed: Spot, call_n: str, target: dict) -> bool:
+    if call_n != target["_call"]:
         return False
-    bands = [b.upper() for b in target.get("bands", [])]
-    modes = [m.upper() for m in target.get("modes", [])]
-    if bands and parsed["band"].upper() not in bands:
+    if target["_bands"] and parsed.band.upper() not in target["_bands"]:
         return False
-    if modes and parsed["mode"].upper() not in modes:
+    if target["_modes"] and parsed.mode.upper() not in target["_modes"]:
         return False
     return True
 
-def should_send(call, dedup_min):
+def should_send(call: str, dedup_min: int) -> bool:
     """Verifies how much time elapsed since last message for given call"""
-    now = datetime.utcnow()
+    now = time.monotonic()
+    window = dedup_min * 60
+    # drop expired entries so the dict doesn't grow forever
+    while last_spots:
+        oldest_time = next(iter(last_spots.values()))
+        if now - oldest_time < window:
+            break
+        last_spots.popitem(last=False)
     last_time = last_spots.get(call)
-    if last_time and now - last_time < timedelta(minutes=dedup_min):
+    if last_time is not None and now - last_time < window:
         return False
     last_spots[call] = now
+    last_spots.move_to_end(call)
     return True
 
 # --- DXCluster Listener ---
@@ -123,66 +206,83 @@ def dxcluster_listener(cfg):
     token = cfg["telegram_token"]
     chat = cfg["chat_id"]
     targets = cfg["targets"]
+    targets_by_call = {}
+    for t in targets:
+        targets_by_call.setdefault(t["_call"], []).append(t)
+    # only a target without band and mode filters can match an unclassified spot
+    has_wildcard_target = any(not t["_bands"] and not t["_modes"] for t in targets)
     dedup_min = int(cfg.get("dedup_minutes", 30))
     mycall = cfg.get("dxcluster_call", "NOCALL")
 
     while True:
         try:
             logging.info(f"Connecting to DX cluster {host}:{port} ...")
-            tn = telnetlib.Telnet(host, port, timeout=60)
-            tn.write((mycall + "\n").encode("utf-8"))
+            sock = socket.create_connection((host, port), timeout=60)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.sendall((mycall + "\n").encode("utf-8"))
             time.sleep(1)
             for cmd in [b"set/skimmer\n", b"set/ft8\n", b"set/announce on\n", b"set/ve7cc 1\n"]:
-                tn.write(cmd)
+                sock.sendall(cmd)
+            buf = bytearray()
+            chunk = memoryview(bytearray(4096))
 
             # --- watchdog + keepalive ---
-            last_activity = datetime.utcnow()
-            keepalive_interval = timedelta(minutes=10)   # sends a command every 10min
-            max_inactive = timedelta(minutes=15)        # if 15min with no spots -> reconnect
+            last_activity = time.monotonic()
+            last_keepalive = last_activity
+            keepalive_interval = 10 * 60   # sends a command after 10min of silence
+            max_inactive = 15 * 60         # if 15min with no data -> reconnect
 
             while True:
-                line = tn.read_until(b"\n", timeout=60)
-                now = datetime.utcnow()
+                idx = buf.find(b"\n")
+                if idx == -1:
+                    now = time.monotonic()
+
+                    # --- WATCHDOG ---
+                    watchdog_at = last_activity + max_inactive
+                    if now >= watchdog_at:
+                        logging.warning("No activity for 15 minutes, reconnecting...")
+                        sock.close()
+                        break
+
+                    # --- KEEPALIVE ---
+                    keepalive_at = max(last_activity, last_keepalive) + keepalive_interval
+                    if now >= keepalive_at:
+                        logging.info("Sending keepalive command to cluster...")
+                        sock.sendall(b"sh/dx\n")
+                        last_keepalive = now
+                        continue
 
-                if line:
-                    text = line.decode("utf-8", errors="replace").strip()
-                    if not text:
+                    # sleep until data arrives or the next deadline
+                    ready, _, _ = select.select([sock], [], [], min(keepalive_at, watchdog_at) - now)
+                    if not ready:
                         continue
-                    last_activity = now
-
-                    if text.startswith("CC"):
-                        parsed = parse_ve7cc_line(text)
-                        if parsed:
-                            for target in targets:
-                                if matches_target(parsed, target):
-                                    call_n = normalize_call(parsed["call"])
-                                    if not should_send(call_n, dedup_min):
-                                        continue
-                                    msg = (
-                                        f"🛰️ <b>Spot DXCluster</b>\n"
-                                        f"Station: <b>{parsed['call']}</b>\n"
-                                        f"Freq: {parsed['freq']} kHz ({parsed['band']})\n"
-                                        f"Mode: {parsed['mode']}\n"
-                                        f"Date/Time: {parsed['datetime']}\n"
-                                        f"Comment: {parsed['info']}\n"
-                                        f"Spotter: {parsed['spotter']}"
-                                    )
-                                    logging.info(f"Sending Telegram alert for {parsed['call']} {parsed['freq']}")
-                                    send_telegram(token, chat, msg)
-                    else:
-                        logging.debug(f"[DX RAW] {text}")
-
-                # --- KEEPALIVE ---
-                if now - last_activity >= keepalive_interval:
-                    logging.info("Sending keepalive command to cluster...")
-                    tn.write(b"sh/dx\n")
-                    last_activity = now
-
-                # --- WATCHDOG ---
-                if now - last_activity >= max_inactive:
-                    logging.warning("No activity for 15 minutes, reconnecting...")
-                    tn.close()
-                    break
+                    n = sock.recv_into(chunk)
+                    if n == 0:
+                        raise ConnectionError("connection closed by cluster")
+                    buf += chunk[:n]
+                    last_activity = time.monotonic()
+                    continue
+
+                line = bytes(buf[:idx]).strip()
+                del buf[:idx + 1]
+                if not line:
+                    continue
+
+                if line.startswith(b"CC"):
+                    # cheap callsign check first, full parse only for targets
+                    call_n = normalize_call(spot_call(line))
+                    matched = targets_by_call.get(call_n)
+                    parsed = parse_ve7cc_line(line, not has_wildcard_target) if matched else None
+                    if parsed:
+                        for target in matched:
+                            if matches_target(parsed, call_n, target):
+                                if not should_send(call_n, dedup_min):
+                                    continue
+                                msg = _MSG_TEMPLATE.format(s=parsed)
+                                logging.info(f"Sending Telegram alert for {parsed.call} {parsed.freq}")
+                                send_telegram(token, chat, msg)
+                elif logging.root.isEnabledFor(logging.DEBUG):
+                    logging.debug(f"[DX RAW] {line.decode('utf-8', errors='replace')}")
 
         except Exception as e:
             logging.error(f"DXCluster Error: {e}")
@@ -191,6 +291,8 @@ def dxcluster_listener(cfg):
 # --- Main ---
 def main():
     cfg = load_config()
+    prepare_targets(cfg["targets"])
+    start_telegram_worker()
     dxcluster_listener(cfg)
 
 if __name__ == "__main__":